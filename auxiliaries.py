@@ -2,7 +2,7 @@
 from __future__ import print_function
 
 import datetime
-import multiprocessing
+import threading
 import csv
 from time import sleep
 import os
@@ -17,6 +17,12 @@ from globalvalues import DEFAULT_DATALOG
 
 import cust_crypt
 
+# parsed config and key files, keyed by (absolute path, modification time)
+_config_cache = {}
+_pubkey_cache = {}
+
+EPOCH = datetime.datetime(year=1970, month=1, day=1)
+
 
 def datetime_from_epoch(timestamp):
     """
@@ -26,8 +32,7 @@ def datetime_from_epoch(timestamp):
     The datetime object is in UTC.
     """
 
-    datetime_value = (datetime.datetime(year=1970, month=1, day=1) +
-                      datetime.timedelta(seconds=timestamp))
+    datetime_value = EPOCH + datetime.timedelta(seconds=timestamp)
     return datetime_value
 
 
@@ -41,6 +46,8 @@ def set_verbosity(class_instance, verbosity=None, logfile=None):
     verbosity for the printing to happen.
 
     If verbosity is not given, get it from class_instance.v.
+    Either way, class_instance.v is set to the verbosity in use, so hot code
+    paths can check it before building an expensive message.
 
     Additionally, logging is supported. If a logfile argument is passed,
     it should be a string indicating a file to write into.
@@ -51,10 +58,14 @@ def set_verbosity(class_instance, verbosity=None, logfile=None):
           set_verbosity(self, verbosity=verbosity)
       ...
       self.vprint(2, 'This only prints if verbosity >= 2')
+      ...
+      if self.v >= 2:
+          self.vprint(2, 'Expensive {}'.format(message))
     """
 
     if verbosity is None:
         verbosity = class_instance.v
+    class_instance.v = verbosity
 
     if logfile is None:
         logging = False
@@ -105,7 +116,7 @@ class LED(object):
     myLED.on()
     myLED.off()
     myLED.flash()   # single flash, like for a count
-    myLED.start_blink(interval=1)   # set the LED blinking in a subprocess
+    myLED.start_blink(interval=1)   # set the LED blinking in a thread
                                     # interval is the period of blink
     myLED.stop_blink()
     """
@@ -120,6 +131,9 @@ class LED(object):
             GPIO.setup(pin, GPIO.OUT)
             self.pin = pin
             self.blinker = None
+            self.blink_interval = 1
+            self.blink_event = threading.Event()
+            self.blink_lock = threading.Lock()
         else:
             raise EnvironmentError('Must be a Raspberry Pi to have an LED')
 
@@ -143,36 +157,45 @@ class LED(object):
 
     def start_blink(self, interval=1):
         """
-        Set the LED in a blinking state using a subprocess.
+        Set the LED in a blinking state using a background thread.
 
         interval is the period of the blink, in seconds.
         """
 
-        if self.blinker:
-            self.blinker.terminate()
-            # this is maybe not necessary, but seems safer
-        self.blinker = multiprocessing.Process(
-            target=self._do_blink, kwargs={'interval': interval})
-        self.blinker.start()
+        self.blink_interval = interval
+        self.blink_event.set()
+        if self.blinker is None:
+            # one thread per LED, reused for every blink after this
+            self.blinker = threading.Thread(target=self._do_blink)
+            self.blinker.daemon = True
+            self.blinker.start()
 
     def stop_blink(self):
         """Switch off the blinking state of the LED"""
-        if self.blinker:
-            self.blinker.terminate()
+        with self.blink_lock:
+            self.blink_event.clear()
         self.off()
 
-    def _do_blink(self, interval=1):
+    def _do_blink(self):
         """
-        Run this method as a subprocess only!
+        Run this method in the blinker thread only!
 
-        It blinks forever (until terminated).
+        It blinks whenever blink_event is set, and idles otherwise.
+        The lock keeps it from toggling the LED after stop_blink returns.
         """
 
         while True:
-            self.on()
-            sleep(interval / 2.0)
-            self.off()
-            sleep(interval / 2.0)
+            self.blink_event.wait()
+            with self.blink_lock:
+                if not self.blink_event.is_set():
+                    continue
+                self.on()
+            sleep(self.blink_interval / 2.0)
+            with self.blink_lock:
+                if not self.blink_event.is_set():
+                    continue
+                self.off()
+            sleep(self.blink_interval / 2.0)
 
 
 class Config(object):
@@ -182,9 +205,22 @@ class Config(object):
 
     def __init__(self, filename, verbosity=1, logfile=None):
         set_verbosity(self, verbosity=verbosity, logfile=logfile)
-        with open(filename, 'rb') as config_file:
-            config_reader = csv.DictReader(config_file)
-            content = config_reader.next()
+        try:
+            key = (os.path.abspath(filename), os.path.getmtime(filename))
+        except OSError:
+            # missing file: let open() raise the IOError callers expect
+            key = None
+        if key in _config_cache:
+            content = _config_cache[key]
+        else:
+            with open(filename, 'r') as config_file:
+                config_reader = csv.reader(config_file)
+                header = next(config_reader)
+                # like DictReader: skip blank lines, fill short rows with None
+                row = next(r for r in config_reader if r)
+                row += [None] * (len(header) - len(row))
+                content = dict(zip(header, row))
+            _config_cache[key] = content
 
         self.ID = content['stationID']
         self.hash = content['message_hash']
@@ -205,9 +241,20 @@ class PublicKey(object):
     def __init__(self, filename, verbosity=1, logfile=None):
         set_verbosity(self, verbosity=verbosity, logfile=logfile)
 
+        try:
+            key = (os.path.abspath(filename), os.path.getmtime(filename))
+        except OSError:
+            # missing file: let PublicDEncrypt raise the usual IOError
+            key = None
+        if key in _pubkey_cache:
+            self.encrypter = _pubkey_cache[key]
+            return
+
         self.encrypter = cust_crypt.PublicDEncrypt(
             key_file_lst=[filename])
-        if not self.encrypter.public_key:
+        if self.encrypter.public_key:
+            _pubkey_cache[key] = self.encrypter
+        else:
             self.encrypter = None
             self.vprint(
                 1, 'Failed to load public key file, {}!'.format(filename))
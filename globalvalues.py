@@ -44,9 +44,11 @@ DEFAULT_PROTOCOL = 'new'
 DEFAULT_INTERVAL_NORMAL = 300
 DEFAULT_INTERVAL_TEST = 30
 DEFAULT_MAX_ACCUM_TIME = 3600
+DEFAULT_MAX_COUNTS = 1000000
 
 DEFAULT_INTERVAL_NORMAL_D3S = 300
 DEFAULT_INTERVAL_TEST_D3S = 10
+DEFAULT_WATERFALL_ROWS_D3S = 1000
 
 # ANSI color codes
 ANSI_RESET = '\033[0m'
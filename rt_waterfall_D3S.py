@@ -1,4 +1,5 @@
 from auxiliaries import set_verbosity
+from globalvalues import DEFAULT_WATERFALL_ROWS_D3S
 import time
 
 import numpy as np
@@ -13,7 +14,8 @@ class Rt_Waterfall_D3S(object):
                  manager=None, 
                  verbosity=1,
                  logfile=None,
-                 resolution=256
+                 resolution=256,
+                 max_rows=DEFAULT_WATERFALL_ROWS_D3S
                 ):
         
         self.v = verbosity
@@ -28,31 +30,30 @@ class Rt_Waterfall_D3S(object):
         
         self.image = None
         self.resolution = resolution
-        
-        self.first = True
+
+        # ring buffer of the most recent spectra, oldest overwritten first
+        self.max_rows = max_rows
+        self.buffer = np.zeros((self.max_rows, self.resolution), dtype=float)
+        self.head = 0
+        self.n_rows = 0
     
     def get_data(self, spectra):
         '''
-        Transfers spectra data to 2 queues that were designed for 
-        real time waterfall mode.
+        Returns the spectra rebinned for real time waterfall mode.
         Call rebin spectra in this method.
         '''
-        new_spectra = self.rebin(spectra)
-        self.manager.wqueue.append(new_spectra)
+        return self.rebin(spectra)
    
     def rebin(self, data, n=4):
         """
         Rebins the array. n is the divisor. Rebin the data in the grab_data method.
         """
-        a = len(data)/n
+        a = len(data) // n
         new_data = np.zeros((self.resolution, 1))
-        i = 0
-        count = 0
-        while i < a:
-            temp = sum(data[i:n*(count+1)])
-            new_data[count] = temp
-            count += 1
-            i += n
+        # same bins as stepping i = 0, n, 2n, ... < a, summed in one call
+        count = -(-a // n)
+        new_data[:count, 0] = np.reshape(
+            np.asarray(data[:n * count], dtype=float), (count, n)).sum(axis=1)
         return new_data
 
     def fix_array(self, array):
@@ -60,29 +61,33 @@ class Rt_Waterfall_D3S(object):
         Used to format arrays for the waterfall plot.
         Called inside make_image.
         """
-        new_array = array.copy()[:self.resolution]
+        new_array = np.array(array[:self.resolution], dtype=float)
         return new_array
       
-    def make_image(self):
+    def make_image(self, spectra):
         """
-        Prepares an array for the waterfall plot
+        Adds rebinned spectra to the array for the waterfall plot
         Call fix_array in this method
         """
-        if self.first:
-            self.image = np.zeros((1, self.resolution),dtype=float)
-            self.first = False
-            temp = self.fix_array(self.manager.wqueue.pop())
-            self.image[0, :] = np.ndarray.flatten(temp)
-        else:
-            temp = self.fix_array(self.manager.wqueue.pop())
-            self.image = np.concatenate((np.transpose(temp), self.image), axis=0)
+        temp = np.ravel(self.fix_array(spectra))
+        self.buffer[self.head] = temp
+        self.head = (self.head + 1) % self.max_rows
+        self.n_rows = min(self.n_rows + 1, self.max_rows)
+
+    def get_display(self):
+        """
+        Returns the waterfall image with the newest spectrum on top.
+        Only needed when the plot is redrawn.
+        """
+        oldest_first = np.concatenate(
+            (self.buffer[self.head:self.n_rows], self.buffer[:self.head]))
+        return oldest_first[::-1]
       
     def waterfall_graph(self, spectra):
         """
         Grabs the data and prepares the waterfall.
         """
-        self.get_data(spectra)
-        self.make_image()
+        self.make_image(self.get_data(spectra))
       
     def start_up(self):
         '''
@@ -99,6 +104,7 @@ class Rt_Waterfall_D3S(object):
         '''
         self.start_up()
         self.waterfall_graph(spectra)
+        self.image = self.get_display()
         plt.imshow(self.image, interpolation='nearest', aspect='auto',
                     extent=[1, 4096, 0, np.shape(self.image)[0]*self.interval])
         plt.colorbar()
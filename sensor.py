@@ -17,7 +17,12 @@ from __future__ import print_function
 import numpy as np
 import time
 import collections
+import threading
 import traceback
+try:
+    import Queue as queue
+except ImportError:
+    import queue
 
 from globalvalues import RPI
 if RPI:
@@ -25,7 +30,13 @@ if RPI:
 
 from auxiliaries import datetime_from_epoch, set_verbosity
 from globalvalues import SIGNAL_PIN
-from globalvalues import DEFAULT_MAX_ACCUM_TIME
+from globalvalues import DEFAULT_MAX_ACCUM_TIME, DEFAULT_MAX_COUNTS
+
+DISPLAY_PAUSE_S = 0.1
+# how long cleanup() waits for a worker thread to finish
+THREAD_STOP_TIMEOUT_S = 2
+# pending LED flashes beyond this are dropped
+FLASH_QUEUE_SIZE = 10
 
 
 class Sensor(object):
@@ -65,9 +76,36 @@ class Sensor(object):
         if counts_LED is None:
             self.vprint(1, 'No LED given for counts; will not flash LED!')
         self.LED = counts_LED
-        # initialize queue of datetime's
-        self.counts = collections.deque([])
-        self.accum_time = max_accumulation_time_s
+        # initialize queue of timestamps.
+        # bounded so an abandoned sensor can't grow without limit.
+        # once full, the oldest counts are dropped silently, even if they
+        #   are still inside the accumulation window.
+        self.counts = collections.deque([], maxlen=DEFAULT_MAX_COUNTS)
+        self.accum_time = float(max_accumulation_time_s)
+
+        # count messages are printed by a separate thread, so the GPIO
+        #   callback never waits on stdout or the logfile
+        self.display_queue = queue.Queue()
+        if self.v >= 1:
+            self.display_thread = threading.Thread(target=self._do_display)
+            self.display_thread.daemon = True
+            self.display_thread.start()
+        else:
+            self.display_thread = None
+
+        # likewise for the LED, which sleeps during each flash
+        self.flash_queue = queue.Queue(maxsize=FLASH_QUEUE_SIZE)
+        if self.LED:
+            self.flash_thread = threading.Thread(target=self._do_flash)
+            self.flash_thread.daemon = True
+            self.flash_thread.start()
+        else:
+            self.flash_thread = None
+
+        # bound once, to save attribute lookups in the GPIO callback
+        self._append_count = self.counts.append
+        self._queue_display = self.display_queue.put_nowait
+        self._queue_flash = self.flash_queue.put_nowait
 
         if RPI:
             # use Broadcom GPIO numbering
@@ -76,9 +114,6 @@ class Sensor(object):
             GPIO.setup(SIGNAL_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
             self.add_interrupt()
 
-        # TODO: check_accumulation every 5 minutes or so?
-        #       to prevent memory leak if it gets abandoned?
-
     def add_interrupt(self, n_tries=3):
         """
         Setup GPIO for signal. (for initialization and GPIO reset)
@@ -112,18 +147,56 @@ class Sensor(object):
         try:
             # add to queue. (usually takes ~10 us)
             now = time.time()
-            self.counts.append(now)
+            self._append_count(now)
 
             # display(s)
-            self.vprint(1, '\tCount at {}'.format(datetime_from_epoch(now)))
+            if self.v >= 1:
+                self._queue_display(now)
             if self.LED:
-                self.LED.flash()
+                try:
+                    self._queue_flash(now)
+                except queue.Full:
+                    pass
         except:
             if self.logfile:
                 with open(self.logfile, 'a') as f:
                     traceback.print_exc(15, f)
             raise
 
+    def _do_display(self):
+        """
+        Run this method in the display thread only!
+
+        Prints queued count messages in batches until a None is queued.
+        """
+
+        while True:
+            timestamps = [self.display_queue.get()]
+            try:
+                while True:
+                    timestamps.append(self.display_queue.get_nowait())
+            except queue.Empty:
+                pass
+            stopping = None in timestamps
+            timestamps = [t for t in timestamps if t is not None]
+            if timestamps:
+                self.vprint(1, '\n'.join(
+                    '\tCount at {}'.format(datetime_from_epoch(t))
+                    for t in timestamps))
+            if stopping:
+                break
+            time.sleep(DISPLAY_PAUSE_S)
+
+    def _do_flash(self):
+        """
+        Run this method in the flash thread only!
+
+        Flashes the LED once per queued count until a None is queued.
+        """
+
+        while self.flash_queue.get() is not None:
+            self.LED.flash()
+
     def get_all_counts(self):
         """Return the list of all counts"""
 
@@ -141,7 +214,15 @@ class Sensor(object):
         #   but it only happens every ~5 minutes anyway.
         #   just as long as there's no memory issue.
 
-        n_counts = np.sum((counts > start_time) & (counts < end_time))
+        if np.all(np.diff(counts) >= 0):
+            # counts are normally in time order, so binary search the window
+            n_counts = max(
+                0, (np.searchsorted(counts, end_time, side='left') -
+                    np.searchsorted(counts, start_time, side='right')))
+        else:
+            # the clock stepped backwards (e.g. NTP sync on a Pi with no
+            #   RTC), so fall back to checking every count
+            n_counts = np.sum((counts > start_time) & (counts < end_time))
 
         err_counts = np.sqrt(n_counts)
         dt = end_time - start_time
@@ -155,9 +236,12 @@ class Sensor(object):
     def check_accumulation(self):
         """Remove counts that are older than accum_time"""
 
+        counts = self.counts
+        popleft = counts.popleft
+        cutoff = time.time() - self.accum_time
         try:
-            while self.counts[0] < time.time() - self.accum_time:
-                self.counts.popleft()
+            while counts[0] < cutoff:
+                popleft()
         except IndexError:      # empty queue
             pass
 
@@ -170,19 +254,29 @@ class Sensor(object):
         self.add_interrupt()
 
     def cleanup(self):
+        # stop the display thread, after it prints any pending counts
+        if self.display_thread and self.display_thread.is_alive():
+            self.display_queue.put(None)
+            self.display_thread.join(THREAD_STOP_TIMEOUT_S)
+        # stop the flash thread, dropping pending flashes so no pin is
+        #   touched after GPIO.cleanup()
+        if self.flash_thread and self.flash_thread.is_alive():
+            try:
+                while True:
+                    self.flash_queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.flash_queue.put(None)
+            self.flash_thread.join(THREAD_STOP_TIMEOUT_S)
         if RPI:
             self.vprint(1, 'Cleaning up GPIO pins')
             GPIO.cleanup()
 
-    def __del__(self):
-        print('Deleting Sensor instance {}'.format(self))
-        self.cleanup()
-
     def __enter__(self):
         # required for using in 'with'
         return self
 
-    def __exit__(self, *args):
+    def __exit__(self, exc_type, exc_val, exc_tb):
         print('Exiting Sensor instance {}'.format(self))
         self.cleanup()
 
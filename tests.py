@@ -6,6 +6,9 @@ import unittest
 import time
 import os
 import csv
+import tempfile
+import threading
+import numpy as np
 
 from globalvalues import RPI
 if RPI:
@@ -15,6 +18,7 @@ import sensor
 import sender
 import auxiliaries
 import cust_crypt
+from Crypto.PublicKey import RSA
 
 from auxiliaries import get_data
 from manager import Manager
@@ -46,6 +50,14 @@ else:
 
 TEST_LOGFILE = 'test.log'
 
+# the waterfall needs matplotlib, which only D3S stations have
+try:
+    import rt_waterfall_D3S
+    waterfall_present = True
+except ImportError:
+    print('matplotlib not found')
+    waterfall_present = False
+
 
 class TestVerbosity(unittest.TestCase):
 
@@ -148,9 +160,13 @@ class TestLEDs(unittest.TestCase):
         print()
 
 
-@unittest.skipUnless(configs_present, "Config test requires config files")
 class TestConfig(unittest.TestCase):
 
+    def setUp(self):
+        fd, self.tmp_config_path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+
+    @unittest.skipUnless(configs_present, "Config test requires config files")
     def test(self):
         config = auxiliaries.Config(test_config_path, verbosity=2)
         self.assertIsNotNone(config.ID)
@@ -158,6 +174,36 @@ class TestConfig(unittest.TestCase):
         self.assertIsNotNone(config.lat)
         self.assertIsNotNone(config.long)
 
+    def test_reload_after_change(self):
+        """
+        Checks that a cached config is re-read once the file changes.
+        """
+        with open(self.tmp_config_path, 'w') as f:
+            f.write('stationID,message_hash,lat,long\n1,abc,37.8,-122.2\n')
+        config = auxiliaries.Config(self.tmp_config_path)
+        self.assertEqual(config.ID, '1')
+
+        with open(self.tmp_config_path, 'w') as f:
+            f.write('stationID,message_hash,lat,long\n2,def,37.9,-122.3\n')
+        mtime = os.path.getmtime(self.tmp_config_path)
+        os.utime(self.tmp_config_path, (mtime + 10, mtime + 10))
+        config = auxiliaries.Config(self.tmp_config_path)
+        self.assertEqual(config.ID, '2')
+        self.assertEqual(config.hash, 'def')
+        self.assertEqual(config.lat, '37.9')
+        self.assertEqual(config.long, '-122.3')
+
+    def test_missing_file(self):
+        os.remove(self.tmp_config_path)
+        with self.assertRaises(IOError):
+            auxiliaries.Config(self.tmp_config_path)
+
+    def tearDown(self):
+        try:
+            os.remove(self.tmp_config_path)
+        except OSError:
+            pass
+
 
 @unittest.skipUnless(configs_present, "PublicKey test requires config files")
 class TestPublicKey(unittest.TestCase):
@@ -175,8 +221,84 @@ class TestPublicKey(unittest.TestCase):
         self.assertIsInstance(encrypted_packet, str)
 
 
+class TestPublicKeyCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # key generation is slow on a Pi, so only make two, once
+        cls.keys = [RSA.generate(1024) for _ in range(2)]
+        cls.pems = [key.publickey().exportKey() for key in cls.keys]
+
+    def setUp(self):
+        fd, self.tmp_key_path = tempfile.mkstemp(suffix='.pub')
+        os.close(fd)
+        self.write_key(0)
+
+    def write_key(self, i):
+        with open(self.tmp_key_path, 'wb') as f:
+            f.write(self.pems[i])
+
+    def test_cached(self):
+        publickey1 = auxiliaries.PublicKey(self.tmp_key_path)
+        publickey2 = auxiliaries.PublicKey(self.tmp_key_path)
+        self.assertIs(publickey1.encrypter, publickey2.encrypter)
+
+    def test_reload_after_change(self):
+        """
+        Checks that a cached key is re-read once the file changes.
+        """
+        publickey1 = auxiliaries.PublicKey(self.tmp_key_path)
+
+        self.write_key(1)
+        mtime = os.path.getmtime(self.tmp_key_path)
+        os.utime(self.tmp_key_path, (mtime + 10, mtime + 10))
+        publickey2 = auxiliaries.PublicKey(self.tmp_key_path)
+        self.assertIsNot(publickey1.encrypter, publickey2.encrypter)
+        self.assertEqual(publickey1.encrypter.public_key.n, self.keys[0].n)
+        self.assertEqual(publickey2.encrypter.public_key.n, self.keys[1].n)
+
+    def test_missing_file(self):
+        os.remove(self.tmp_key_path)
+        with self.assertRaises(IOError):
+            auxiliaries.PublicKey(self.tmp_key_path)
+
+    def tearDown(self):
+        try:
+            os.remove(self.tmp_key_path)
+        except OSError:
+            pass
+
+
 class TestSensor(unittest.TestCase):
 
+    class FakeLED(object):
+        """
+        Records flashes instead of using GPIO.
+        flash() blocks until release is set.
+        """
+        def __init__(self):
+            self.flashes = 0
+            self.started = threading.Event()
+            self.release = threading.Event()
+
+        def flash(self):
+            self.started.set()
+            self.release.wait()
+            self.flashes += 1
+
+    def LED_sensor(self):
+        led = TestSensor.FakeLED()
+        led_sensor = sensor.Sensor(
+            counts_LED=led, use_gpio=False, verbosity=0)
+        self.addCleanup(led_sensor.cleanup)
+        self.addCleanup(led.release.set)
+        return led, led_sensor
+
+    def wait_for_flashes(self, led, n, timeout=2):
+        end_time = time.time() + timeout
+        while led.flashes < n and time.time() < end_time:
+            time.sleep(0.01)
+
     def setUp(self):
         # fake sensor - only simulating counts
         self.sensor = sensor.Sensor(max_accumulation_time_s=2, use_gpio=False)
@@ -209,6 +331,158 @@ class TestSensor(unittest.TestCase):
         time.sleep(1)
         self.assertEqual(len(self.sensor.get_all_counts()), 0)
 
+    def test_display_thread_stops(self):
+        [self.sensor.count() for _ in xrange(3)]
+        self.assertTrue(self.sensor.display_thread.is_alive())
+        self.sensor.cleanup()
+        self.assertFalse(self.sensor.display_thread.is_alive())
+
+    def test_no_display_thread_when_quiet(self):
+        quiet_sensor = sensor.Sensor(use_gpio=False, verbosity=0)
+        self.addCleanup(quiet_sensor.cleanup)
+        self.assertIsNone(quiet_sensor.display_thread)
+        [quiet_sensor.count() for _ in xrange(3)]
+        self.assertTrue(quiet_sensor.display_queue.empty())
+
+    def test_flash_off_callback(self):
+        led, led_sensor = self.LED_sensor()
+        start = time.time()
+        led_sensor.count()
+        # flash() is still blocked, but count() has returned
+        self.assertTrue(led.started.wait(2))
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(led.flashes, 0)
+
+        led.release.set()
+        self.wait_for_flashes(led, 1)
+        self.assertEqual(led.flashes, 1)
+
+    def test_flash_queue_full(self):
+        led, led_sensor = self.LED_sensor()
+        led_sensor.count()
+        self.assertTrue(led.started.wait(2))
+        # the first flash is in progress, so only FLASH_QUEUE_SIZE more fit
+        [led_sensor.count() for _ in xrange(sensor.FLASH_QUEUE_SIZE + 5)]
+        self.assertEqual(len(led_sensor.get_all_counts()),
+                         sensor.FLASH_QUEUE_SIZE + 6)
+
+        led.release.set()
+        self.wait_for_flashes(led, sensor.FLASH_QUEUE_SIZE + 1)
+        time.sleep(0.1)
+        self.assertEqual(led.flashes, sensor.FLASH_QUEUE_SIZE + 1)
+
+    def test_no_flash_after_cleanup(self):
+        led, led_sensor = self.LED_sensor()
+        led_sensor.count()
+        self.assertTrue(led.started.wait(2))
+        [led_sensor.count() for _ in xrange(5)]
+
+        # let the in-progress flash finish while cleanup() is waiting
+        threading.Timer(0.1, led.release.set).start()
+        led_sensor.cleanup()
+        self.assertFalse(led_sensor.flash_thread.is_alive())
+        # the in-progress flash finished; the pending ones were dropped
+        flashes = led.flashes
+        self.assertEqual(flashes, 1)
+
+        time.sleep(0.1)
+        self.assertEqual(led.flashes, flashes)
+        # a second cleanup is harmless
+        led_sensor.cleanup()
+        self.assertEqual(led.flashes, flashes)
+
+    def test_cpm_window(self):
+        now = time.time()
+        start_time = now - 1.5
+        end_time = now - 0.5
+        for t in (start_time, start_time + 0.25, end_time - 0.25, end_time):
+            self.sensor.counts.append(t)
+
+        # counts exactly on start_time and end_time are excluded
+        cpm, cpm_err = self.sensor.get_cpm(start_time, end_time)
+        self.assertAlmostEqual(cpm, 2 * 60 / (end_time - start_time))
+
+    def test_cpm_unsorted(self):
+        # as if the clock stepped backwards between counts
+        now = time.time()
+        start_time = now - 1.5
+        end_time = now - 0.5
+        for t in (now - 1, now - 0.2, now - 1.2, now - 1.8):
+            self.sensor.counts.append(t)
+
+        cpm, cpm_err = self.sensor.get_cpm(start_time, end_time)
+        self.assertAlmostEqual(cpm, 2 * 60 / (end_time - start_time))
+
+    def test_cpm_reversed_window(self):
+        now = time.time()
+        for t in (now - 1, now - 0.8):
+            self.sensor.counts.append(t)
+
+        cpm, cpm_err = self.sensor.get_cpm(now - 0.5, now - 1.5)
+        self.assertEqual(cpm, 0)
+        self.assertEqual(cpm_err, 0)
+
+
+@unittest.skipUnless(waterfall_present, "Waterfall tests require matplotlib")
+class TestWaterfallRebin(unittest.TestCase):
+
+    class FakeManager(object):
+        interval = 1
+        logfile = None
+
+    def setUp(self):
+        self.waterfall = rt_waterfall_D3S.Rt_Waterfall_D3S(
+            manager=TestWaterfallRebin.FakeManager())
+
+    def loop_rebin(self, data, n=4):
+        """
+        The original loop version of rebin, kept as the reference.
+
+        It only sums the first len(data)/n channels into bins of n.
+        """
+        a = len(data) // n
+        new_data = np.zeros((self.waterfall.resolution, 1))
+        i = 0
+        count = 0
+        while i < a:
+            new_data[count] = sum(data[i:n * (count + 1)])
+            count += 1
+            i += n
+        return new_data
+
+    def test_rebin(self):
+        # full D3S spectrum, and a length that isn't a multiple of n
+        for length in (4096, 1023):
+            data = np.random.poisson(10, size=length).astype(float)
+            np.testing.assert_array_equal(
+                self.waterfall.rebin(data), self.loop_rebin(data))
+
+
+@unittest.skipUnless(waterfall_present, "Waterfall tests require matplotlib")
+class TestWaterfallImage(unittest.TestCase):
+
+    def setUp(self):
+        self.waterfall = rt_waterfall_D3S.Rt_Waterfall_D3S(
+            manager=TestWaterfallRebin.FakeManager(), max_rows=3)
+
+    def add_spectrum(self, value):
+        spectrum = np.full((self.waterfall.resolution, 1), float(value))
+        self.waterfall.make_image(spectrum)
+
+    def test_ring_buffer(self):
+        self.add_spectrum(1)
+        image = self.waterfall.get_display()
+        self.assertEqual(image.shape, (1, self.waterfall.resolution))
+        np.testing.assert_array_equal(image[:, 0], [1])
+
+        # 4 more spectra wrap the 3-row buffer; newest first, oldest dropped
+        for value in (2, 3, 4, 5):
+            self.add_spectrum(value)
+        image = self.waterfall.get_display()
+        self.assertEqual(image.shape, (3, self.waterfall.resolution))
+        np.testing.assert_array_equal(image[:, 0], [5, 4, 3])
+        np.testing.assert_array_equal(image[:, -1], [5, 4, 3])
+
 
 class TestSender(unittest.TestCase):
 